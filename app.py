@@ -1,14 +1,22 @@
 #!/usr/bin/env python3
+import errno
 import os
+import select
 import sys
 import subprocess
 import tkinter as tk
 from tkinter import ttk, messagebox
-import threading
 import socket
 import time
 import signal
 
+# Apps run in their own process group so that stopping one also stops
+# anything it started (chess.py runs a server and two clients)
+if sys.platform == "win32":
+    APP_GROUP_OPTIONS = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+else:
+    APP_GROUP_OPTIONS = {"start_new_session": True}
+
 class CanvasAppsLauncher:
     """
     A launcher application that provides a GUI to select and launch
@@ -24,6 +32,10 @@ class CanvasAppsLauncher:
         
         # Active processes
         self.active_processes = {}
+        self._reaper_scheduled = False  # A _reap_processes call is pending on the Tk loop
+        self._stopping = []  # (process, pgid, kill deadline) for apps asked to exit
+        self._pending_tree_updates = {}  # process_id -> row values not yet shown
+        self._tree_flush_scheduled = False
         
         # Available apps
         self.apps = [
@@ -61,8 +73,12 @@ class CanvasAppsLauncher:
             },
         ]
         
+        # Script file name -> display name, for labelling launched processes
+        self._module_to_name = {app["module"]: app["name"] for app in self.apps}
+        
         # Track if socket_canvas is running
         self.socket_canvas_process = None
+        self._canvas_probe = None  # (time.monotonic() of the last port probe, its result)
         
         # Create the GUI
         self.create_widgets()
@@ -200,20 +216,31 @@ class CanvasAppsLauncher:
     
     def create_app_cards(self):
         """Create card-like displays for each app"""
-        # Create cards for "All" category
-        self.create_category_app_cards("All", self.apps)
-        
         # Group apps by category
-        apps_by_category = {}
+        self._apps_by_category = {"All": self.apps}
         for app in self.apps:
             category = app["category"]
-            if category not in apps_by_category:
-                apps_by_category[category] = []
-            apps_by_category[category].append(app)
-        
-        # Create cards for each category
-        for category, apps in apps_by_category.items():
-            self.create_category_app_cards(category, apps)
+            if category not in self._apps_by_category:
+                self._apps_by_category[category] = []
+            self._apps_by_category[category].append(app)
+        
+        # Only the "All" tab is visible at startup. The other tabs get their
+        # cards the first time they are selected.
+        self._tab_categories = {str(frame): category for category, frame in self.category_frames.items()}
+        self._built_categories = set()
+        self._build_category_tab("All")
+        self.notebook.bind("<<NotebookTabChanged>>", self._on_tab_changed)
+    
+    def _build_category_tab(self, category):
+        if category not in self._built_categories:
+            self._built_categories.add(category)
+            self.create_category_app_cards(category, self._apps_by_category[category])
+    
+    def _on_tab_changed(self, event):
+        """Fill in a category tab when it is shown for the first time"""
+        category = self._tab_categories.get(self.notebook.select())
+        if category is not None:
+            self._build_category_tab(category)
     
     def create_category_app_cards(self, category, apps):
         """Create app cards for a specific category"""
@@ -224,10 +251,20 @@ class CanvasAppsLauncher:
         scrollbar = ttk.Scrollbar(frame, orient="vertical", command=canvas.yview)
         scrollable_frame = ttk.Frame(canvas)
         
-        scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
+        # <Configure> fires continuously while the window is resized, so only
+        # recompute the scroll region once the burst has settled
+        pending_update = [None]
+        
+        def update_scrollregion():
+            pending_update[0] = None
+            canvas.configure(scrollregion=canvas.bbox("all"))
+        
+        def on_configure(event):
+            if pending_update[0] is not None:
+                canvas.after_cancel(pending_update[0])
+            pending_update[0] = canvas.after(16, update_scrollregion)
+        
+        scrollable_frame.bind("<Configure>", on_configure)
         
         canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
         canvas.configure(yscrollcommand=scrollbar.set)
@@ -288,9 +325,8 @@ class CanvasAppsLauncher:
                 parent=self.root
             )
             if response:
+                # Returns once the canvas is listening (or has failed)
                 self.start_socket_canvas()
-                # Give it time to start
-                time.sleep(1)
                 if not self.check_socket_canvas():
                     messagebox.showerror(
                         "Error",
@@ -308,10 +344,12 @@ class CanvasAppsLauncher:
                 [sys.executable, module],
                 # Don't capture stdout/stderr
                 stdout=None,
-                stderr=None
+                stderr=None,
+                **APP_GROUP_OPTIONS
             )
             
-            app_name = next((app["name"] for app in self.apps if app["module"] == module), module)
+            # Apps are launched by path, e.g. ./editor/main.py, and listed by file name
+            app_name = self._module_to_name.get(os.path.basename(module), module)
             
             # Add to active processes
             process_id = str(process.pid)
@@ -319,7 +357,10 @@ class CanvasAppsLauncher:
                 "process": process,
                 "app_name": app_name,
                 "module": module,
-                "status": "Running"
+                "status": "Running",
+                # The app leads its own group; remembered here because the
+                # pid may be reused once the app has been reaped
+                "pgid": process.pid
             }
             
             # Add to treeview
@@ -328,13 +369,8 @@ class CanvasAppsLauncher:
                 values=(app_name, process_id, "Running", "Stop")
             )
             
-            # Start monitoring thread for this process
-            monitor_thread = threading.Thread(
-                target=self.monitor_process,
-                args=(process_id,),
-                daemon=True
-            )
-            monitor_thread.start()
+            # Watch for it to exit
+            self._schedule_reaper()
             
         except Exception as e:
             messagebox.showerror(
@@ -343,47 +379,73 @@ class CanvasAppsLauncher:
                 parent=self.root
             )
     
-    def monitor_process(self, process_id):
-        """Monitor a running process"""
-        if process_id not in self.active_processes:
-            return
-        
-        process_info = self.active_processes[process_id]
-        process = process_info["process"]
-        
-        # Wait for process to finish
-        process.wait()
+    def _schedule_reaper(self):
+        """Make sure a check for exited processes is pending"""
+        if not self._reaper_scheduled:
+            self._reaper_scheduled = True
+            self.root.after(250, self._reap_processes)
+    
+    def _reap_processes(self):
+        """Update the status of launched apps and the canvas once they exit (runs on the Tk loop)"""
+        self._reaper_scheduled = False
+        still_running = False
+        
+        # The canvas status only changes when our canvas exits, so that is
+        # when it gets re-checked
+        if self.socket_canvas_process is not None:
+            if self.socket_canvas_process.poll() is None:
+                still_running = True
+            else:
+                self.socket_canvas_process = None
+                self.invalidate_socket_canvas_status()
         
-        # Update status if the process is still in our dictionary
-        if process_id in self.active_processes:
-            return_code = process.returncode
-            status = "Finished" if return_code == 0 else f"Error ({return_code})"
+        for process_id, process_info in list(self.active_processes.items()):
+            if process_info["status"] != "Running":
+                continue
             
-            # Update the status in the dictionary
-            self.active_processes[process_id]["status"] = status
+            # poll() reaps the child without blocking
+            return_code = process_info["process"].poll()
+            if return_code is None:
+                still_running = True
+                continue
             
-            # Update the treeview if it still exists
-            try:
-                # Update the UI from the main thread
-                self.root.after(0, lambda: self.update_process_status(process_id, status))
-            except Exception:
-                # The item might have been removed
-                pass
+            status = "Finished" if return_code == 0 else f"Error ({return_code})"
+            process_info["status"] = status
+            self.update_process_status(process_id, status)
+        
+        # Keep checking only while something is left to watch
+        if still_running:
+            self._schedule_reaper()
     
     def update_process_status(self, process_id, status):
-        """Update process status in the treeview (called from main thread)"""
-        try:
-            if process_id in self.active_processes:
-                process_info = self.active_processes[process_id]
-                self.process_tree.item(process_id, values=(
-                    process_info["app_name"],
-                    process_id,
-                    status,
-                    "Remove"
-                ))
-        except tk.TclError:
-            # Item might have been removed
-            pass
+        """Update process status in the treeview"""
+        if process_id in self.active_processes:
+            process_info = self.active_processes[process_id]
+            self._queue_tree_update(process_id, (
+                process_info["app_name"],
+                process_id,
+                status,
+                "Remove"
+            ))
+    
+    def _queue_tree_update(self, process_id, values):
+        """Set a treeview row's values on the next idle pass, with later updates replacing earlier ones"""
+        self._pending_tree_updates[process_id] = values
+        if not self._tree_flush_scheduled:
+            self._tree_flush_scheduled = True
+            self.root.after_idle(self._flush_tree_updates)
+    
+    def _flush_tree_updates(self):
+        """Apply the queued treeview updates in one go"""
+        self._tree_flush_scheduled = False
+        updates = self._pending_tree_updates
+        self._pending_tree_updates = {}
+        for process_id, values in updates.items():
+            try:
+                self.process_tree.item(process_id, values=values)
+            except tk.TclError:
+                # Item might have been removed
+                pass
     
     def stop_selected_process(self):
         """Stop the selected process"""
@@ -410,27 +472,17 @@ class CanvasAppsLauncher:
             return
         
         process_info = self.active_processes[process_id]
-        process = process_info["process"]
+        
+        # Apps that already exited have been reaped and their pid may
+        # belong to something else by now
+        if process_info["status"] != "Running":
+            return
         
         try:
-            # Try to terminate gracefully
-            process.terminate()
-            
-            # Give it some time to terminate
-            for _ in range(5):  # Wait up to 0.5 seconds
-                if process.poll() is not None:
-                    break
-                time.sleep(0.1)
-            
-            # Force kill if still running
-            if process.poll() is None:
-                if sys.platform == "win32":
-                    os.kill(process.pid, signal.CTRL_BREAK_EVENT)
-                else:
-                    os.kill(process.pid, signal.SIGKILL)
+            self._begin_stop(process_info["process"], process_info["pgid"])
             
             # Update status in treeview
-            self.process_tree.item(process_id, values=(
+            self._queue_tree_update(process_id, (
                 process_info["app_name"],
                 process_id,
                 "Stopped",
@@ -447,6 +499,82 @@ class CanvasAppsLauncher:
                 parent=self.root
             )
     
+    def terminate_process(self, process, timeout=0.5):
+        """Ask a process to exit, killing it if it is still running after timeout seconds"""
+        process.terminate()
+        try:
+            # Returns as soon as the process exits
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            if sys.platform == "win32":
+                os.kill(process.pid, signal.CTRL_BREAK_EVENT)
+            else:
+                os.kill(process.pid, signal.SIGKILL)
+    
+    def _signal_app(self, process, pgid, kill=False):
+        """Signal a launched app's whole process group"""
+        try:
+            if sys.platform == "win32":
+                if kill:
+                    os.kill(process.pid, signal.CTRL_BREAK_EVENT)
+                else:
+                    process.terminate()
+            else:
+                os.killpg(pgid, signal.SIGKILL if kill else signal.SIGTERM)
+        except ProcessLookupError:
+            # The app and everything it started have already exited
+            pass
+    
+    def _app_running(self, process, pgid):
+        """Whether the app or anything in its process group is still running"""
+        # Reap the app itself first; as a zombie it would keep the group alive
+        if process.poll() is None:
+            return True
+        if sys.platform == "win32":
+            return False
+        try:
+            # Signal 0 only checks that the group still has members, such as
+            # the server and clients chess.py started
+            os.killpg(pgid, 0)
+            return True
+        except ProcessLookupError:
+            return False
+    
+    def _begin_stop(self, process, pgid, timeout=0.5):
+        """Ask an app to exit; it is killed if still running after timeout seconds"""
+        self._signal_app(process, pgid)
+        if not self._stopping:
+            self.root.after(int(timeout * 1000), self._kill_stopping)
+        self._stopping.append((process, pgid, time.monotonic() + timeout))
+    
+    def _kill_stopping(self, wait=False):
+        """Kill the apps that are past their deadline and still running.
+        
+        With wait=True this blocks until every deadline has passed instead of
+        checking again later on the Tk loop."""
+        now = time.monotonic()
+        pending = []
+        for process, pgid, deadline in self._stopping:
+            if deadline > now and not wait:
+                if self._app_running(process, pgid):
+                    pending.append((process, pgid, deadline))
+                continue
+            # Give the group until its deadline to exit on its own
+            while self._app_running(process, pgid):
+                if time.monotonic() >= deadline:
+                    self._signal_app(process, pgid, kill=True)
+                    # Nothing else polls a stopped app, so keep checking
+                    # until the group is gone and the app has been reaped
+                    if not wait:
+                        pending.append((process, pgid, time.monotonic() + 0.05))
+                    break
+                time.sleep(0.02)
+        
+        self._stopping = pending
+        if pending:
+            delay = min(deadline for _, _, deadline in pending) - now
+            self.root.after(max(1, int(delay * 1000)), self._kill_stopping)
+    
     def stop_all_processes(self):
         """Stop all running processes"""
         if not self.active_processes:
@@ -457,29 +585,52 @@ class CanvasAppsLauncher:
             )
             return
         
+        # Every app is signalled right away and shares a single check
+        # for survivors, so nothing here waits on the apps
         for process_id in list(self.active_processes.keys()):
             self.stop_process(process_id)
     
     def check_socket_canvas(self):
         """Check if socket_canvas is running"""
-        # Check if our process is running
+        # Check if our process is running; poll() is a non-blocking waitpid
         if self.socket_canvas_process and self.socket_canvas_process.poll() is None:
             self.update_socket_canvas_status(True)
             return True
         
-        # Check if port 5005 is in use
+        # Check if port 5005 is in use, reusing a result from the last second
+        now = time.monotonic()
+        if self._canvas_probe is None or now - self._canvas_probe[0] >= 1.0:
+            self._canvas_probe = (now, self._probe_socket_canvas_port())
+        is_running = self._canvas_probe[1]
+        self.update_socket_canvas_status(is_running)
+        return is_running
+    
+    def _probe_socket_canvas_port(self):
+        """Try to connect to port 5005 without stalling the Tk loop"""
         try:
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(0.5)
+        except OSError:
+            return False
+        try:
+            sock.setblocking(False)
             result = sock.connect_ex(('127.0.0.1', 5005))
-            sock.close()
-            
-            is_running = result == 0
-            self.update_socket_canvas_status(is_running)
-            return is_running
-        except:
-            self.update_socket_canvas_status(False)
+            if result in (errno.EINPROGRESS, errno.EWOULDBLOCK):
+                # Loopback accepts or refuses straight away; the timeout
+                # is only a bound
+                _, writable, _ = select.select([], [sock], [], 0.05)
+                if not writable:
+                    return False
+                result = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            return result == 0
+        except OSError:
             return False
+        finally:
+            sock.close()
+    
+    def invalidate_socket_canvas_status(self):
+        """Drop the cached port probe and check the canvas again"""
+        self._canvas_probe = None
+        self.check_socket_canvas()
     
     def update_socket_canvas_status(self, is_running):
         """Update the socket canvas status display"""
@@ -500,23 +651,10 @@ class CanvasAppsLauncher:
             # Stop the socket canvas
             if self.socket_canvas_process:
                 try:
-                    self.socket_canvas_process.terminate()
-                    
-                    # Give it some time to terminate
-                    for _ in range(5):  # Wait up to 0.5 seconds
-                        if self.socket_canvas_process.poll() is not None:
-                            break
-                        time.sleep(0.1)
-                    
-                    # Force kill if still running
-                    if self.socket_canvas_process.poll() is None:
-                        if sys.platform == "win32":
-                            os.kill(self.socket_canvas_process.pid, signal.CTRL_BREAK_EVENT)
-                        else:
-                            os.kill(self.socket_canvas_process.pid, signal.SIGKILL)
+                    self.terminate_process(self.socket_canvas_process)
                     
                     self.socket_canvas_process = None
-                    self.update_socket_canvas_status(False)
+                    self.invalidate_socket_canvas_status()
                     
                 except Exception as e:
                     messagebox.showerror(
@@ -534,6 +672,7 @@ class CanvasAppsLauncher:
     
     def start_socket_canvas(self):
         """Start the socket canvas process"""
+        self._canvas_probe = None
         try:
             # Launch socket_canvas without capturing its output
             self.socket_canvas_process = subprocess.Popen(
@@ -543,12 +682,18 @@ class CanvasAppsLauncher:
                 stderr=None
             )
             
-            # Give it some time to start
-            time.sleep(0.5)
+            # Wait until it accepts connections, so apps launched right
+            # after this can connect, or until it exits
+            deadline = time.monotonic() + 3.0
+            while self.socket_canvas_process.poll() is None and time.monotonic() < deadline:
+                if self._probe_socket_canvas_port():
+                    break
+                time.sleep(0.02)
             
             # Check if it's running
             if self.socket_canvas_process.poll() is None:
                 self.update_socket_canvas_status(True)
+                self._schedule_reaper()
             else:
                 # Process terminated quickly - something went wrong
                 error_msg = "Socket canvas process terminated unexpectedly"
@@ -580,16 +725,14 @@ class CanvasAppsLauncher:
             # Stop all processes
             self.stop_all_processes()
         
+        # The pending check for survivors won't run once the window is gone
+        if self._stopping:
+            self._kill_stopping(wait=True)
+        
         # Stop socket canvas if we started it
         if self.socket_canvas_process and self.socket_canvas_process.poll() is None:
             try:
-                self.socket_canvas_process.terminate()
-                time.sleep(0.1)
-                if self.socket_canvas_process.poll() is None:
-                    if sys.platform == "win32":
-                        os.kill(self.socket_canvas_process.pid, signal.CTRL_BREAK_EVENT)
-                    else:
-                        os.kill(self.socket_canvas_process.pid, signal.SIGKILL)
+                self.terminate_process(self.socket_canvas_process, timeout=0.1)
             except:
                 pass
         
@@ -598,13 +741,13 @@ class CanvasAppsLauncher:
     
     def run(self):
         """Run the launcher application"""
-        # Set up periodic socket canvas check
+        # Our own canvas is watched by the process reaper. This slow check
+        # only catches a canvas started or stopped outside the launcher.
         def check_socket_periodically():
-            self.check_socket_canvas()
-            self.root.after(5000, check_socket_periodically)
+            self.invalidate_socket_canvas_status()
+            self.root.after(30000, check_socket_periodically)
         
-        # Start the periodic check
-        self.root.after(5000, check_socket_periodically)
+        self.root.after(30000, check_socket_periodically)
         
         # Start the mainloop
         self.root.mainloop()
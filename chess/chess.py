@@ -1,4 +1,5 @@
 import subprocess
+import socket
 import time
 import sys
 import os
@@ -17,9 +18,28 @@ def print_colored(text, color):
     }
     print(f"{colors.get(color, '')}{text}{colors['end']}")
 
+# How long the canvas gets to open its window before clients connect. It
+# isn't probed: socket_canvas.py opens a window for every connection.
+CANVAS_STARTUP_DELAY = 1.0
+
+def wait_port(port, timeout=5.0):
+    """Wait until something accepts connections on a local port; False on timeout"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.settimeout(0.05)
+        try:
+            if s.connect_ex(('127.0.0.1', port)) == 0:
+                return True
+        finally:
+            s.close()
+        time.sleep(0.01)
+    return False
+
 def run_component(name, command, color):
+    # command is an argv list, started directly without a shell
     print_colored(f"Starting {name}...", color)
-    return subprocess.Popen(command, shell=True)
+    return subprocess.Popen(command)
 
 def main():
     parser = argparse.ArgumentParser(description='Run Integrated Chess Platform')
@@ -34,34 +54,38 @@ def main():
     
     try:
         # Start canvas server
-        canvas_cmd = "python socket_canvas.py"
+        canvas_cmd = [sys.executable, "socket_canvas.py"]
         canvas_process = run_component("Canvas Server", canvas_cmd, "green")
+        canvas_started = time.monotonic()
         processes.append(canvas_process)
         
-        # Wait for canvas to start
-        time.sleep(1)
-        
         # Start game server
-        server_cmd = f"python chess_server.py --port {args.server_port}"
+        server_cmd = [sys.executable, "chess_server.py", "--port", str(args.server_port)]
         server_process = run_component("Chess Server", server_cmd, "blue")
         processes.append(server_process)
         
         # Wait for server to start
-        time.sleep(1)
+        if not wait_port(args.server_port):
+            print_colored("Chess server did not start listening in time", "red")
         
-        # Start clients
+        # The canvas started alongside the server; give it the rest of its
+        # startup time and check that it is still running
+        remaining = canvas_started + CANVAS_STARTUP_DELAY - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        if canvas_process.poll() is not None:
+            print_colored(f"Canvas server exited early (is another canvas already on port {args.canvas_port}?)", "red")
+        
+        # Start clients; the server is accepting, so they can all go at once
         for i in range(args.players):
             player_name = args.name or f"Player{i+1}"
             if args.players > 1:
                 player_name = f"{player_name}{i+1}"
                 
-            client_cmd = (f"python chess_client.py --port {args.canvas_port} "
-                         f"--server-port {args.server_port} --name {player_name}")
+            client_cmd = [sys.executable, "chess_client.py", "--port", str(args.canvas_port),
+                          "--server-port", str(args.server_port), "--name", player_name]
             client_process = run_component(f"Chess Client {i+1}", client_cmd, "purple")
             processes.append(client_process)
-            
-            # Brief delay between starting clients
-            time.sleep(0.5)
         
         print_colored("\nAll components started! Press Ctrl+C to shut down.\n", "cyan")
         print_colored("Modern Chess Game Instructions:", "yellow")
@@ -5,12 +5,23 @@ import json
 import argparse
 
 class ModernChessClient:
-    def __init__(self, host='localhost', port=5005, server_host='localhost', server_port=5006, player_name=None):
+    # Hover repaints are limited to one frame per interval
+    FRAME_INTERVAL = 1 / 60
+    
+    def __init__(self, host='localhost', port=5005, server_host='localhost', server_port=5006, player_name=None, tcp_nodelay=True):
+        # Send small writes (moves, draw commands) right away instead of
+        # letting Nagle's algorithm hold them back
+        self.tcp_nodelay = tcp_nodelay
+        
         # Canvas connection
         self.host = host
         self.port = port
         self.socket = None
         self.connected = False
+        self._out_buf = None  # Commands of the frame being drawn, sent by end_frame
+        self._render_lock = threading.Lock()  # Both listener threads render
+        self._last_render_time = 0.0
+        self._render_timer = None  # Pending deferred hover repaint
         
         # Server connection
         self.server_host = server_host
@@ -131,10 +142,18 @@ class ModernChessClient:
         
         return True
     
+    def configure_socket(self, sock):
+        """Set the options shared by the canvas and server sockets"""
+        if self.tcp_nodelay:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Notice a peer that went away without closing the connection
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    
     def connect_to_canvas(self):
         """Connect to the canvas for rendering"""
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.configure_socket(self.socket)
             self.socket.connect((self.host, self.port))
             self.connected = True
             
@@ -152,6 +171,7 @@ class ModernChessClient:
         """Connect to the game server"""
         try:
             self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.configure_socket(self.server_socket)
             self.server_socket.connect((self.server_host, self.server_port))
             self.server_connected = True
             
@@ -204,6 +224,11 @@ class ModernChessClient:
         if not command.endswith('\n'):
             command += '\n'
         
+        # Inside a frame, commands are held and sent together by end_frame
+        if self._out_buf is not None:
+            self._out_buf += command.encode('utf-8')
+            return True
+        
         try:
             self.socket.sendall(command.encode('utf-8'))
             return True
@@ -212,6 +237,25 @@ class ModernChessClient:
             self.connected = False
             return False
     
+    def begin_frame(self):
+        """Start collecting draw commands instead of sending each one"""
+        self._out_buf = bytearray()
+    
+    def end_frame(self):
+        """Send every command collected since begin_frame in a single write"""
+        frame = self._out_buf
+        self._out_buf = None
+        if not frame or not self.connected:
+            return False
+        
+        try:
+            self.socket.sendall(frame)
+            return True
+        except Exception as e:
+            print(f"Send error: {e}")
+            self.connected = False
+            return False
+    
     def send_to_server(self, data):
         """Send data to the game server"""
         if not self.server_connected:
@@ -685,7 +729,7 @@ class ModernChessClient:
             
             # Only re-render if hover state changed to reduce network traffic
             if old_hover != self.hover_square:
-                self.render()
+                self.request_render()
     
     def handle_resize(self, event_parts):
         """Handle resize event"""
@@ -699,14 +743,35 @@ class ModernChessClient:
             
             self.render()
     
+    def request_render(self):
+        """Render now, or on a timer if the last frame was less than FRAME_INTERVAL ago"""
+        delay = self._last_render_time + self.FRAME_INTERVAL - time.monotonic()
+        if delay <= 0:
+            self.render()
+        elif self._render_timer is None:
+            # Hover changes until the timer fires share its frame
+            self._render_timer = threading.Timer(delay, self._deferred_render)
+            self._render_timer.daemon = True
+            self._render_timer.start()
+    
+    def _deferred_render(self):
+        self._render_timer = None
+        self.render()
+    
     def render(self):
         """Render the game"""
-        self.clear_screen()
-        
-        if self.in_lobby:
-            self.render_lobby()
-        elif self.in_game:
-            self.render_game()
+        with self._render_lock:
+            self.begin_frame()
+            try:
+                self.clear_screen()
+                
+                if self.in_lobby:
+                    self.render_lobby()
+                elif self.in_game:
+                    self.render_game()
+            finally:
+                self.end_frame()
+                self._last_render_time = time.monotonic()
         
     def render_lobby(self):
         """Render the game lobby"""
@@ -974,10 +1039,12 @@ def main():
     parser.add_argument('--server-host', default='localhost', help='Game server host')
     parser.add_argument('--server-port', type=int, default=5006, help='Game server port')
     parser.add_argument('--name', help='Player name')
+    parser.add_argument('--nagle', action='store_true', help='Let TCP coalesce small writes (disables TCP_NODELAY)')
     
     args = parser.parse_args()
     
-    client = ModernChessClient(args.host, args.port, args.server_host, args.server_port, args.name)
+    client = ModernChessClient(args.host, args.port, args.server_host, args.server_port, args.name,
+                               tcp_nodelay=not args.nagle)
     
     if client.connect():
         # Register event handlers
@@ -0,0 +1,55 @@
+import time
+from collections import deque
+
+### Profiler.py ###
+# Optional timing for the editor's hot paths. Methods are wrapped at the
+# class level so each call records (name, duration in ns, bytes) into a
+# bounded deque; nothing is wrapped unless the editor runs with --profile.
+# Comparing socket writes per frame with time spent in the buffer shows
+# whether a frame is bound by syscalls or by Python work.
+
+class Profiler:
+    def __init__(self, max_samples=4096):
+        self.samples = deque(maxlen=max_samples)  # (name, duration_ns, bytes)
+
+    def wrap(self, cls, name, count_bytes=False):
+        """Time every call to cls.name; count_bytes records len() of the first argument"""
+        func = getattr(cls, name)
+        label = f"{cls.__name__}.{name}"
+        record = self.samples.append
+        clock = time.perf_counter_ns
+
+        def timed(self, *args, **kwargs):
+            start = clock()
+            result = func(self, *args, **kwargs)
+            record((label, clock() - start, len(args[0]) if count_bytes else 0))
+            return result
+
+        timed.__name__ = func.__name__
+        setattr(cls, name, timed)
+
+    def report(self):
+        """Print call counts, latency percentiles and bytes for the recorded samples"""
+        by_name = {}
+        for name, duration, nbytes in self.samples:
+            durations, total = by_name.get(name, ([], 0))
+            durations.append(duration)
+            by_name[name] = (durations, total + nbytes)
+
+        print(f"Profile of the last {len(self.samples)} calls (microseconds):")
+        for name, (durations, total) in sorted(by_name.items()):
+            durations.sort()
+            count = len(durations)
+            p50 = durations[count // 2] / 1000
+            p90 = durations[count * 9 // 10] / 1000
+            p99 = durations[count * 99 // 100] / 1000
+            line = f"  {name:32} n={count:<6} p50={p50:<9.1f} p90={p90:<9.1f} p99={p99:.1f}"
+            if total:
+                line += f" bytes={total}"
+            print(line)
+
+        # Socket writes per rendered frame
+        frames = len(by_name.get("Renderer.render", ((), 0))[0])
+        writes = len(by_name.get("TextEditorClient._send_bytes", ((), 0))[0])
+        if frames:
+            print(f"  {writes / frames:.2f} socket writes per frame")
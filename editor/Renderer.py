@@ -1,7 +1,3 @@
-import threading
-from TextEditorClient import TextEditorClient
-from TextBuffer import TextBuffer
-
 # Renderer.py
 # This module defines a Renderer class for a text editor that handles the
 # rendering of text, line numbers, cursor, and a command legend on a canvas.
@@ -9,198 +5,417 @@ from TextBuffer import TextBuffer
 # the text content and cursor position.
 
 class Renderer:
+    # Repainted lines are drawn on top of the old ones, so force a clear every
+    # so often to keep the number of canvas items bounded
+    MAX_INCREMENTAL_ROWS = 1000
+    
+    EDITOR_NAME = "Canvas Text Editor (Press Ctrl+H for help)"
+    
+    LEGEND_TITLE = "Keyboard Shortcuts"
+    LEGEND_COMMANDS = (
+        ("Ctrl+C", "Copy"),
+        ("Ctrl+X", "Cut"),
+        ("Ctrl+V", "Paste"),
+        ("Ctrl+A", "Select All"),
+        ("Ctrl+N", "New Document"),
+        ("Ctrl+L", "Toggle Line Numbers"),
+        ("Ctrl+H", "Toggle This Help"),
+        ("Arrow Keys", "Navigation"),
+        ("Shift+Arrows", "Select Text"),
+        ("Home/End", "Start/End of Line"),
+        ("Tab", "Insert 4 spaces"),
+        ("Escape", "Clear Selection")
+    )
+    
     def __init__(self, client, text_buffer):
         self.client = client
         self.buffer = text_buffer
         self.canvas_width = 800  # Default width
         self.canvas_height = 600  # Default height
         self.cursor_blink = True
-        self.cursor_blink_timer = None
+        self._blink_generation = 0  # Bumped to cancel the blink timer already queued
+        self._blinking = False
         self.status_bar_height = 20
         self.line_numbers = True
         self.gutter_width = 40  # Width for line numbers
+        self.content_x = self.gutter_width  # Left edge of the text, past the gutter if shown
         self.show_legend = False  # Toggle for command legend
         self.legend_width = 250   # Width of the legend box
         self.legend_height = 210  # Height of the legend box
+        self.background_color = "#FFFFFF"
+        
+        # Line number labels only depend on the row index, so build each one
+        # once and reuse it on every frame
+        self._lineno_cache = []
+        
+        # Text widths and positions that only change with the canvas size
+        # (or, for the line count, with the number of lines)
+        self._editor_name_px = len(self.EDITOR_NAME) * self.buffer.char_width
+        self._legend_layout_key = None
+        self._legend_layout_cache = None
+        self._legend_blob_key = None
+        self._legend_blob = b""  # Encoded legend commands for _legend_blob_key
+        self._line_count_key = None
+        self._line_count_text = ""
+        self._line_count_x = 0
+        
+        # Incremental repaint state. Only lines that changed since the last
+        # frame are redrawn; everything else is left on the canvas. It is
+        # only touched from the client's event loop thread, so needs no lock.
+        self._needs_full_repaint = True
+        self._last_fingerprint = None
+        self._dirty_lines = set()
+        self._dirty_from = None  # Every line from this row down is dirty
+        self._last_layout = None
+        self._last_cursor = None
+        self._last_selection = None
+        self._last_status = None
+        self._rows_since_clear = 0
+        self._sel_cache_key = None  # (selection, buffer version, content_x) of _sel_cache
+        self._sel_cache = {}  # Row -> (x, width) of its selection highlight
+        self._row_signatures = {}  # Row -> (text, cursor, selection) it was last painted with
+        
+        # Get notified about buffer edits so we know which lines to repaint
+        self.buffer.on_change = self.mark_dirty_lines
+        
+    def invalidate(self):
+        """Force the next render to clear and repaint the whole canvas"""
+        self._needs_full_repaint = True
+        
+    def mark_dirty_lines(self, first_row, last_row=None):
+        """Mark lines first_row..last_row as changed (last_row=None means to the end)"""
+        if last_row is None:
+            if self._dirty_from is None or first_row < self._dirty_from:
+                self._dirty_from = first_row
+        else:
+            self._dirty_lines.update(range(first_row, last_row + 1))
         
     def render(self):
-        # Clear the screen
-        self.client.clear_screen()
+        # One socket write per frame
+        with self.client.batch():
+            self._render()
+            
+    def _render(self):
+        # Bind the buffer state used throughout the frame to locals
+        buf = self.buffer
+        lines = buf.lines
+        n_lines = len(lines)
+        cw = buf.char_width
+        ch = buf.char_height
+        
+        # Skip the frame entirely if nothing observable has changed
+        fingerprint = (buf.version, buf.cursor_row, buf.cursor_col, buf.scroll_y,
+                       buf.selection_start, buf.selection_end, self.cursor_blink,
+                       self.line_numbers, self.show_legend, self.canvas_width, self.canvas_height)
+        if fingerprint == self._last_fingerprint and not self._needs_full_repaint:
+            return
+        self._last_fingerprint = fingerprint
         
         # Calculate visible lines based on scroll position
         content_height = self.canvas_height - self.status_bar_height
-        visible_lines_count = content_height // self.buffer.char_height
+        visible_lines_count = content_height // ch
         
         # Make sure cursor is visible
-        self.buffer.ensure_cursor_visible(visible_lines_count)
+        buf.ensure_cursor_visible(visible_lines_count)
         
-        start_line = self.buffer.scroll_y
-        end_line = min(start_line + visible_lines_count, len(self.buffer.lines))
+        start_line = buf.scroll_y
+        end_line = min(start_line + visible_lines_count, n_lines)
         
-        # Draw gutter background
-        if self.line_numbers:
-            self.client.draw_rect(0, 0, self.gutter_width, content_height, "#F0F0F0")
-            # Draw separator line
-            self.client.draw_rect(self.gutter_width - 1, 0, 1, content_height, "#D0D0D0")
+        # Scrolling, resizing or toggling the gutter/legend moves everything
+        layout = (self.canvas_width, self.canvas_height, buf.scroll_y,
+                  self.line_numbers, self.show_legend)
+        if layout != self._last_layout or self._rows_since_clear > self.MAX_INCREMENTAL_ROWS:
+            self._needs_full_repaint = True
         
-        # Get content x offset (accounting for gutter)
-        content_x = self.gutter_width if self.line_numbers else 0
+        cursor = (buf.cursor_row, buf.cursor_col, self.cursor_blink)
         
         # Get ordered selection if exists
         selection_info = None
-        if self.buffer.has_selection():
-            selection_info = self.buffer.get_ordered_selection()
+        if buf.selection_active:
+            selection_info = buf.get_ordered_selection()
+        
+        full_repaint = self._needs_full_repaint
+        if full_repaint:
+            rows = range(start_line, start_line + visible_lines_count)
+        else:
+            # Lines whose cursor or selection state changed need a repaint too
+            last_visible = start_line + visible_lines_count - 1
+            dirty = self._dirty_lines
+            if cursor != self._last_cursor:
+                dirty.add(cursor[0])
+                if self._last_cursor:
+                    dirty.add(self._last_cursor[0])
+            if selection_info != self._last_selection:
+                for sel in (selection_info, self._last_selection):
+                    if sel:
+                        dirty.update(range(max(sel[0], start_line), min(sel[2], last_visible) + 1))
+            if self._dirty_from is not None:
+                dirty.update(range(max(self._dirty_from, start_line), last_visible + 1))
+            rows = sorted(row for row in dirty if start_line <= row <= last_visible)
+        
+        self._needs_full_repaint = False
+        self._dirty_lines = set()
+        self._dirty_from = None
+        self._last_layout = layout
+        self._last_cursor = cursor
+        self._last_selection = selection_info
         
-        # Draw visible text lines
-        for i in range(start_line, end_line):
-            y = (i - start_line) * self.buffer.char_height
+        # Remember what each row was painted with, and drop dirty rows that
+        # would come out exactly the same as what is already on the canvas
+        signatures = self._row_signatures
+        if full_repaint:
+            signatures.clear()
+        painted = []
+        cursor_only = False  # The cursor just blinked on over an unchanged row
+        cursor_row, cursor_col, blink = cursor
+        if selection_info:
+            start_row, start_col, end_row, end_col = selection_info
+        for i in rows:
+            selected = None
+            if selection_info and start_row <= i <= end_row:
+                selected = (start_col if i == start_row else 0,
+                            end_col if i == end_row else -1)
+            signature = (lines[i] if i < n_lines else None,
+                         (cursor_col, blink) if i == cursor_row else None,
+                         selected)
+            previous = signatures.get(i)
+            if previous != signature:
+                signatures[i] = signature
+                if (blink and i == cursor_row and not self.show_legend and previous is not None
+                        and previous == (signature[0], (cursor_col, False), selected)):
+                    # Drawing the cursor on top is enough
+                    cursor_only = True
+                else:
+                    painted.append(i)
+        if not full_repaint:
+            rows = painted
+        
+        if full_repaint:
+            # Clear the screen and paint the content background
+            self.client.clear_screen()
+            self.client.draw_rect(0, 0, self.canvas_width, content_height, self.background_color)
+            self._rows_since_clear = 0
+            self._last_status = None
             
-            # Draw line number
+            # Draw gutter background
             if self.line_numbers:
-                line_num = str(i + 1).rjust(4)
-                self.client.draw_text(5, y, "#808080", line_num)
-            
-            # Draw line highlight for cursor line
-            if i == self.buffer.cursor_row:
-                self.client.draw_rect(
-                    content_x, y, 
-                    self.canvas_width - content_x, self.buffer.char_height, 
-                    "#F8F8F8"
-                )
+                self.client.draw_rect(0, 0, self.gutter_width, content_height, "#F0F0F0")
+                # Draw separator line
+                self.client.draw_rect(self.gutter_width - 1, 0, 1, content_height, "#D0D0D0")
+        else:
+            self._rows_since_clear += len(rows)
+        
+        # Get content x offset (accounting for gutter)
+        content_x = self.content_x
+        
+        # Extend the line number cache to cover the visible lines
+        lineno_cache = self._lineno_cache
+        while len(lineno_cache) < end_line:
+            lineno_cache.append(str(len(lineno_cache) + 1).rjust(4))
+        
+        draw_rect = self.client.draw_rect
+        line_width = self.canvas_width - content_x
+        
+        if not full_repaint:
+            # Paint over whatever was drawn for these lines last frame
+            if self.line_numbers:
+                gutter_width = self.gutter_width
+                for i in rows:
+                    y = (i - start_line) * ch
+                    draw_rect(0, y, gutter_width, ch, "#F0F0F0")
+                    draw_rect(gutter_width - 1, y, 1, ch, "#D0D0D0")
+            background_color = self.background_color
+            for i in rows:
+                if i != cursor_row:
+                    draw_rect(content_x, (i - start_line) * ch, line_width, ch, background_color)
+        
+        # Draw line highlight for cursor line
+        if cursor_row in rows:
+            draw_rect(content_x, (cursor_row - start_line) * ch, line_width, ch, "#F8F8F8")
+        
+        # Draw selection highlight, only for selected lines that are being painted
+        if selection_info:
+            start_row, start_col, end_row, end_col = selection_info
+            sel_lo = max(start_row, start_line)
+            sel_hi = min(end_row, end_line - 1)
+            if full_repaint:
+                selected_rows = range(sel_lo, sel_hi + 1)
+            else:
+                selected_rows = [i for i in rows if sel_lo <= i <= sel_hi]
             
-            # Draw line text
-            self.client.draw_text(content_x, y, "#000000", self.buffer.lines[i])
+            # Highlight spans only change with the selection, the text or
+            # the gutter, so reuse the ones from earlier frames
+            sel_key = (selection_info, buf.version, content_x)
+            if sel_key != self._sel_cache_key:
+                self._sel_cache_key = sel_key
+                self._sel_cache = {}
+            sel_cache = self._sel_cache
             
-            # Draw selection highlight if exists
-            if selection_info:
-                start_row, start_col, end_row, end_col = selection_info
-                
-                if start_row <= i <= end_row:
+            for i in selected_rows:
+                span = sel_cache.get(i)
+                if span is None:
                     # Calculate highlight position
                     highlight_start_x = content_x
-                    highlight_end_x = content_x + len(self.buffer.lines[i]) * self.buffer.char_width
+                    highlight_end_x = content_x + len(lines[i]) * cw
                     
                     if i == start_row:
-                        highlight_start_x = content_x + start_col * self.buffer.char_width
+                        highlight_start_x = content_x + start_col * cw
                     if i == end_row:
-                        highlight_end_x = content_x + end_col * self.buffer.char_width
+                        highlight_end_x = content_x + end_col * cw
                     
-                    # Draw selection highlight
-                    if highlight_end_x > highlight_start_x:
-                        self.client.draw_rect(
-                            highlight_start_x, y,
-                            highlight_end_x - highlight_start_x, self.buffer.char_height,
-                            "#ADD8E6"  # Light blue
-                        )
-        
-        # Draw cursor if visible and in blink state
-        if self.cursor_blink and start_line <= self.buffer.cursor_row < end_line:
-            cursor_x = content_x + self.buffer.cursor_col * self.buffer.char_width
-            cursor_y = (self.buffer.cursor_row - start_line) * self.buffer.char_height
-            self.client.draw_rect(cursor_x, cursor_y, 2, self.buffer.char_height, "#0000FF")
-        
-        # Draw command legend if enabled
-        if self.show_legend:
-            self._draw_command_legend()
-        
-        # Draw status bar
+                    span = sel_cache[i] = (highlight_start_x, highlight_end_x - highlight_start_x)
+                
+                if span[1] > 0:
+                    draw_rect(span[0], (i - start_line) * ch, span[1], ch,
+                              "#ADD8E6")  # Light blue
+        
+        # Draw line numbers and text in one batch. Lines past the end of the
+        # document are just left blank.
+        text_batch = []
+        append = text_batch.append
+        text_rows = [i for i in rows if i < end_line]
+        if self.line_numbers:
+            for i in text_rows:
+                y = (i - start_line) * ch
+                append((5, y, "#808080", lineno_cache[i]))
+                append((content_x, y, "#000000", lines[i]))
+        else:
+            for i in text_rows:
+                append((content_x, (i - start_line) * ch, "#000000", lines[i]))
+        self.client.draw_text_batch(text_batch)
+        
+        # Draw cursor if visible and in blink state. It only needs drawing when
+        # its line was repainted; otherwise it is still on the canvas.
+        cursor_repainted = full_repaint or cursor_only or buf.cursor_row in rows
+        if cursor_repainted and self.cursor_blink and start_line <= buf.cursor_row < end_line:
+            cursor_x = content_x + buf.cursor_col * cw
+            cursor_y = (buf.cursor_row - start_line) * ch
+            draw_rect(cursor_x, cursor_y, 2, ch, "#0000FF")
+        
+        # Draw command legend if enabled (again if repainted lines covered it)
+        if self.show_legend and rows:
+            legend_top = content_height - self.legend_height - 20
+            last_y = (rows[-1] - start_line + 1) * ch
+            if full_repaint or last_y > legend_top:
+                self._draw_command_legend()
+        
+        # Draw status bar, only if what it shows has changed
+        status = (buf.cursor_row, buf.cursor_col, n_lines)
+        if status == self._last_status:
+            return
+        self._last_status = status
+        
+        # The line count text and its right-aligned position only change with
+        # the line count or the canvas width
+        line_count_key = (n_lines, self.canvas_width)
+        if line_count_key != self._line_count_key:
+            self._line_count_text = f"Total Lines: {n_lines}"
+            self._line_count_x = self.canvas_width - (len(self._line_count_text) * cw) - 10
+            self._line_count_key = line_count_key
+        
         status_y = self.canvas_height - self.status_bar_height
         self.client.draw_rect(0, status_y, self.canvas_width, self.status_bar_height, "#2C3E50")
         
-        # Draw status text
-        position_text = f"Line: {self.buffer.cursor_row+1}, Col: {self.buffer.cursor_col+1}"
-        line_count_text = f"Total Lines: {len(self.buffer.lines)}"
-        
         # Left-aligned position info
+        position_text = f"Line: {buf.cursor_row+1}, Col: {buf.cursor_col+1}"
         self.client.draw_text(10, status_y + 3, "#FFFFFF", position_text)
         
         # Right-aligned line count
-        right_text_x = self.canvas_width - (len(line_count_text) * self.buffer.char_width) - 10
-        self.client.draw_text(right_text_x, status_y + 3, "#FFFFFF", line_count_text)
+        self.client.draw_text(self._line_count_x, status_y + 3, "#FFFFFF", self._line_count_text)
         
         # Center editor name with legend toggle hint
-        editor_name = "Canvas Text Editor (Press Ctrl+H for help)"
-        center_x = (self.canvas_width - len(editor_name) * self.buffer.char_width) // 2
-        self.client.draw_text(center_x, status_y + 3, "#FFFFFF", editor_name)
+        center_x = (self.canvas_width - self._editor_name_px) // 2
+        self.client.draw_text(center_x, status_y + 3, "#FFFFFF", self.EDITOR_NAME)
+        
+    def _legend_layout(self):
+        """Legend positions, recomputed only when the canvas size changes"""
+        key = (self.canvas_width, self.canvas_height)
+        if key != self._legend_layout_key:
+            # Calculate legend position (bottom right)
+            legend_x = self.canvas_width - self.legend_width - 20
+            legend_y = self.canvas_height - self.legend_height - self.status_bar_height - 20
+            title_x = legend_x + (self.legend_width - len(self.LEGEND_TITLE) * self.buffer.char_width) // 2
+            
+            # (shortcut x, y, shortcut, description x, description) per row
+            rows = [
+                (legend_x + 15, legend_y + 35 + i * 15, shortcut, legend_x + 115, description)
+                for i, (shortcut, description) in enumerate(self.LEGEND_COMMANDS)
+            ]
+            self._legend_layout_cache = (legend_x, legend_y, title_x, rows)
+            self._legend_layout_key = key
+        return self._legend_layout_cache
         
     def _draw_command_legend(self):
         """Draw a command reference legend in the bottom right corner"""
-        # Calculate legend position (bottom right)
-        legend_x = self.canvas_width - self.legend_width - 20
-        legend_y = self.canvas_height - self.legend_height - self.status_bar_height - 20
+        # The legend only changes with the canvas size, so its commands are
+        # recorded once and the same bytes are resent on later frames
+        key = (self.canvas_width, self.canvas_height)
+        if key != self._legend_blob_key:
+            with self.client.capture() as commands:
+                self._emit_command_legend()
+            if not commands:
+                return  # Not connected; nothing was recorded
+            self._legend_blob = bytes(commands)
+            self._legend_blob_key = key
+        self.client.send_bytes(self._legend_blob)
+        
+    def _emit_command_legend(self):
+        legend_x, legend_y, title_x, rows = self._legend_layout()
         
         # Draw semi-transparent background
         self.client.draw_rect(legend_x, legend_y, self.legend_width, self.legend_height, "#F8F8F8")
         
         # Draw border
-        border_color = "#2C3E50"
-        # Top border
-        self.client.draw_rect(legend_x, legend_y, self.legend_width, 1, border_color)
-        # Left border
-        self.client.draw_rect(legend_x, legend_y, 1, self.legend_height, border_color)
-        # Right border
-        self.client.draw_rect(legend_x + self.legend_width - 1, legend_y, 1, self.legend_height, border_color)
-        # Bottom border
-        self.client.draw_rect(legend_x, legend_y + self.legend_height - 1, self.legend_width, 1, border_color)
+        self.client.draw_border(legend_x, legend_y, self.legend_width, self.legend_height, "#2C3E50")
         
         # Draw title
-        title = "Keyboard Shortcuts"
-        title_x = legend_x + (self.legend_width - len(title) * self.buffer.char_width) // 2
-        self.client.draw_text(title_x, legend_y + 5, "#000000", title)
+        self.client.draw_text(title_x, legend_y + 5, "#000000", self.LEGEND_TITLE)
         
         # Draw horizontal separator
         self.client.draw_rect(legend_x + 10, legend_y + 25, self.legend_width - 20, 1, "#AAAAAA")
         
         # Draw command shortcuts
-        commands = [
-            ("Ctrl+C", "Copy"),
-            ("Ctrl+X", "Cut"),
-            ("Ctrl+V", "Paste"),
-            ("Ctrl+A", "Select All"),
-            ("Ctrl+N", "New Document"),
-            ("Ctrl+L", "Toggle Line Numbers"),
-            ("Ctrl+H", "Toggle This Help"),
-            ("Arrow Keys", "Navigation"),
-            ("Shift+Arrows", "Select Text"),
-            ("Home/End", "Start/End of Line"),
-            ("Tab", "Insert 4 spaces"),
-            ("Escape", "Clear Selection")
-        ]
-        
-        y_offset = legend_y + 35
-        for shortcut, description in commands:
+        for shortcut_x, y, shortcut, description_x, description in rows:
             # Draw shortcut (left column)
-            self.client.draw_text(legend_x + 15, y_offset, "#2C3E50", shortcut)
+            self.client.draw_text(shortcut_x, y, "#2C3E50", shortcut)
             
             # Draw description (right column)
-            self.client.draw_text(legend_x + 115, y_offset, "#000000", description)
-            
-            y_offset += 15
+            self.client.draw_text(description_x, y, "#000000", description)
         
     def toggle_cursor_blink(self):
         self.cursor_blink = not self.cursor_blink
         self.render()
         
     def start_cursor_blink(self):
-        if self.cursor_blink_timer:
-            self.cursor_blink_timer.cancel()
+        if self._blinking:
+            return
+        
+        # The client's event loop toggles the cursor every 500ms
+        self._blinking = True
+        self._blink_generation += 1
+        self._schedule_blink(self._blink_generation)
         
-        # Toggle cursor every 500ms
-        self.cursor_blink_timer = threading.Timer(0.5, self.start_cursor_blink)
-        self.cursor_blink_timer.daemon = True
-        self.cursor_blink_timer.start()
+    def _schedule_blink(self, generation):
+        self.client.call_later(0.5, lambda: self._blink_tick(generation))
         
+    def _blink_tick(self, generation):
+        # A stop (or a stop and restart) since this was queued cancels it
+        if generation != self._blink_generation:
+            return
         self.toggle_cursor_blink()
+        self._schedule_blink(generation)
         
     def stop_cursor_blink(self):
-        if self.cursor_blink_timer:
-            self.cursor_blink_timer.cancel()
-            self.cursor_blink_timer = None
+        self._blinking = False
+        self._blink_generation += 1
             
     def toggle_line_numbers(self):
         self.line_numbers = not self.line_numbers
+        self.content_x = self.gutter_width if self.line_numbers else 0
+        self.invalidate()
         self.render()
         
     def toggle_legend(self):
         self.show_legend = not self.show_legend
+        self.invalidate()
         self.render()
\ No newline at end of file
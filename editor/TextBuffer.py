@@ -5,185 +5,233 @@
 # for inserting, deleting, and moving text, as well as handling cursor
 # visibility and text selection.
 
+from contextlib import contextmanager
+
 class TextBuffer:
     def __init__(self):
-        self.lines = [""]
+        self.lines = [""]  # One str per line; keys arrive as Unicode text
         self.cursor_row = 0
         self.cursor_col = 0
         self.char_width = 8  # As per README
         self.char_height = 14  # As per README
         self.scroll_y = 0
-        self.selection_start = None
-        self.selection_end = None
+        self._ordered_selection = None  # Cached result of get_ordered_selection
+        self._selection_start = None
+        self._selection_end = None
+        self.selection_active = False  # Both endpoints are set; kept up to date by the setters
+        self.on_change = None  # Called with (first_row, last_row) after edits
+        self.version = 0  # Bumped on every edit to the text
+        self._batch_depth = 0
+        self._batch_span = None  # (first_row, last_row) changed inside a batch
         
-    def insert_char(self, char):
-        # Remove any selected text if there's a selection
-        self.delete_selection()
+    def mark_dirty(self, first_row, last_row=None):
+        """Report changed lines; last_row=None means every line from first_row down"""
+        self.version += 1
+        if self._batch_depth:
+            # Widen the pending span instead of notifying now
+            if self._batch_span is not None:
+                batch_first, batch_last = self._batch_span
+                first_row = min(first_row, batch_first)
+                if last_row is not None and batch_last is not None:
+                    last_row = max(last_row, batch_last)
+                else:
+                    last_row = None
+            self._batch_span = (first_row, last_row)
+        elif self.on_change:
+            self.on_change(first_row, last_row)
+    
+    @contextmanager
+    def batch(self):
+        """Group several edits so on_change fires once, covering all of them"""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth and self._batch_span is not None:
+                first_row, last_row = self._batch_span
+                self._batch_span = None
+                if self.on_change:
+                    self.on_change(first_row, last_row)
+    
+    def _splice_lines(self, start, stop, new_lines):
+        """Replace lines[start:stop] with new_lines in a single slice assignment.
         
-        # Handle newline
-        if char == '\n':
-            # Split the current line at cursor
-            current_line = self.lines[self.cursor_row]
-            before_cursor = current_line[:self.cursor_col]
-            after_cursor = current_line[self.cursor_col:]
-            
-            # Update current line to be text before cursor
-            self.lines[self.cursor_row] = before_cursor
-            
-            # Insert new line with text after cursor
-            self.lines.insert(self.cursor_row + 1, after_cursor)
-            
-            # Move cursor to beginning of new line
-            self.cursor_row += 1
-            self.cursor_col = 0
-        else:
-            # Insert character at cursor position
-            current_line = self.lines[self.cursor_row]
-            new_line = current_line[:self.cursor_col] + char + current_line[self.cursor_col:]
-            self.lines[self.cursor_row] = new_line
-            self.cursor_col += 1
+        Every edit that adds or removes lines goes through here, so this is
+        the only place that depends on lines being a plain list."""
+        self.lines[start:stop] = new_lines
+        self.mark_dirty(start)
+    
+    def reset(self):
+        """Replace the document with a single empty line"""
+        self.clear_selection()
+        self.cursor_row = 0
+        self.cursor_col = 0
+        self.scroll_y = 0
+        self._splice_lines(0, len(self.lines), [""])
+    
+    def line_count(self):
+        return len(self.lines)
+    
+    def snapshot(self):
+        """Immutable copy of the lines that other threads can read without locking"""
+        return tuple(self.lines)
+    
+    def join_with_next(self, row):
+        """Append the line after row onto row, removing it from the buffer"""
+        lines = self.lines
+        self._splice_lines(row, row + 2, [lines[row] + lines[row + 1]])
+    
+    def line_length(self, row):
+        """Number of characters on the given line"""
+        return len(self.lines[row])
+        
+    def insert_char(self, char):
+        # A newline splits the line at the cursor, which insert_text already
+        # does for multi-line text, so every insert shares one code path
+        self.insert_text(char)
     
     def delete_char(self):
         # If there's a selection, delete it
-        if self.has_selection():
+        if self.selection_active:
             self.delete_selection()
             return
             
         if self.cursor_col > 0:
-            # Delete character before cursor
+            # Delete character before cursor (a single slice at end of line)
             current_line = self.lines[self.cursor_row]
-            new_line = current_line[:self.cursor_col-1] + current_line[self.cursor_col:]
+            if self.cursor_col == len(current_line):
+                new_line = current_line[:-1]
+            else:
+                new_line = current_line[:self.cursor_col-1] + current_line[self.cursor_col:]
             self.lines[self.cursor_row] = new_line
+            self.mark_dirty(self.cursor_row, self.cursor_row)
             self.cursor_col -= 1
         elif self.cursor_row > 0:
-            # At beginning of line, join with previous line
-            current_line = self.lines[self.cursor_row]
-            prev_line = self.lines[self.cursor_row - 1]
-            
-            # Set cursor to end of previous line
-            self.cursor_col = len(prev_line)
-            
-            # Join lines
-            self.lines[self.cursor_row - 1] = prev_line + current_line
-            
-            # Remove current line
-            self.lines.pop(self.cursor_row)
-            
-            # Move cursor up
+            # At beginning of line, join with previous line. The cursor ends
+            # up where the previous line used to end.
             self.cursor_row -= 1
+            self.cursor_col = len(self.lines[self.cursor_row])
+            self.join_with_next(self.cursor_row)
     
-    def move_cursor_left(self, select=False):
-        # Update selection if needed
+    def _begin_move(self, select):
+        # Anchor a new selection at the cursor, or drop the current one
         if select:
-            if not self.has_selection():
+            if not self.selection_active:
                 self.selection_start = (self.cursor_row, self.cursor_col)
         else:
             self.clear_selection()
-            
-        if self.cursor_col > 0:
-            self.cursor_col -= 1
-        elif self.cursor_row > 0:
-            self.cursor_row -= 1
-            self.cursor_col = len(self.lines[self.cursor_row])
-            
+    
+    def _end_move(self, select):
         # Update selection end if selecting
         if select:
             self.selection_end = (self.cursor_row, self.cursor_col)
     
+    def move_cursor_left(self, select=False):
+        self._begin_move(select)
+        row, col = self.cursor_row, self.cursor_col
+        if col > 0:
+            self.cursor_col = col - 1
+        elif row > 0:
+            self.cursor_row = row - 1
+            self.cursor_col = len(self.lines[row - 1])
+        self._end_move(select)
+    
     def move_cursor_right(self, select=False):
-        # Update selection if needed
-        if select:
-            if not self.has_selection():
-                self.selection_start = (self.cursor_row, self.cursor_col)
-        else:
-            self.clear_selection()
-            
-        if self.cursor_col < len(self.lines[self.cursor_row]):
-            self.cursor_col += 1
-        elif self.cursor_row < len(self.lines) - 1:
-            self.cursor_row += 1
+        self._begin_move(select)
+        row, col, lines = self.cursor_row, self.cursor_col, self.lines
+        if col < len(lines[row]):
+            self.cursor_col = col + 1
+        elif row < len(lines) - 1:
+            self.cursor_row = row + 1
             self.cursor_col = 0
-            
-        # Update selection end if selecting
-        if select:
-            self.selection_end = (self.cursor_row, self.cursor_col)
+        self._end_move(select)
     
     def move_cursor_up(self, select=False):
-        # Update selection if needed
-        if select:
-            if not self.has_selection():
-                self.selection_start = (self.cursor_row, self.cursor_col)
-        else:
-            self.clear_selection()
-            
-        if self.cursor_row > 0:
-            self.cursor_row -= 1
+        self._begin_move(select)
+        row = self.cursor_row
+        if row > 0:
+            self.cursor_row = row - 1
             # Adjust column if new line is shorter
-            self.cursor_col = min(self.cursor_col, len(self.lines[self.cursor_row]))
-            
-        # Update selection end if selecting
-        if select:
-            self.selection_end = (self.cursor_row, self.cursor_col)
+            self.cursor_col = min(self.cursor_col, len(self.lines[row - 1]))
+        self._end_move(select)
     
     def move_cursor_down(self, select=False):
-        # Update selection if needed
-        if select:
-            if not self.has_selection():
-                self.selection_start = (self.cursor_row, self.cursor_col)
-        else:
-            self.clear_selection()
-            
-        if self.cursor_row < len(self.lines) - 1:
-            self.cursor_row += 1
+        self._begin_move(select)
+        row, lines = self.cursor_row, self.lines
+        if row < len(lines) - 1:
+            self.cursor_row = row + 1
             # Adjust column if new line is shorter
-            self.cursor_col = min(self.cursor_col, len(self.lines[self.cursor_row]))
-            
-        # Update selection end if selecting
-        if select:
-            self.selection_end = (self.cursor_row, self.cursor_col)
+            self.cursor_col = min(self.cursor_col, len(lines[row + 1]))
+        self._end_move(select)
     
     def move_cursor_to_position(self, row, col, select=False):
         # Validate position
         row = max(0, min(row, len(self.lines) - 1))
         col = max(0, min(col, len(self.lines[row])))
         
-        # Update selection if needed
-        if select:
-            if not self.has_selection():
-                self.selection_start = (self.cursor_row, self.cursor_col)
-        else:
-            self.clear_selection()
-        
         # Move cursor
+        self._begin_move(select)
         self.cursor_row = row
         self.cursor_col = col
-        
-        # Update selection end if selecting
-        if select:
-            self.selection_end = (self.cursor_row, self.cursor_col)
+        self._end_move(select)
+    
+    # Selection endpoints are properties so that any write drops the cached
+    # ordered selection and refreshes selection_active
+    @property
+    def selection_start(self):
+        return self._selection_start
+    
+    @selection_start.setter
+    def selection_start(self, value):
+        self._selection_start = value
+        self._ordered_selection = None
+        self.selection_active = value is not None and self._selection_end is not None
+    
+    @property
+    def selection_end(self):
+        return self._selection_end
+    
+    @selection_end.setter
+    def selection_end(self, value):
+        self._selection_end = value
+        self._ordered_selection = None
+        self.selection_active = value is not None and self._selection_start is not None
     
     def has_selection(self):
-        return self.selection_start is not None and self.selection_end is not None
+        return self.selection_active
+    
+    def select_all(self):
+        """Select the whole document and put the cursor at its end"""
+        last_row = len(self.lines) - 1
+        last_col = len(self.lines[last_row])
+        self.selection_start = (0, 0)
+        self.selection_end = (last_row, last_col)
+        self.cursor_row = last_row
+        self.cursor_col = last_col
     
     def clear_selection(self):
         self.selection_start = None
         self.selection_end = None
     
     def get_ordered_selection(self):
-        if not self.has_selection():
+        if self._ordered_selection is not None:
+            return self._ordered_selection
+        if not self.selection_active:
             return None
             
-        start_row, start_col = self.selection_start
-        end_row, end_col = self.selection_end
+        start_row, start_col = self._selection_start
+        end_row, end_col = self._selection_end
         
         # Make sure start is before end
         if start_row > end_row or (start_row == end_row and start_col > end_col):
-            return (end_row, end_col, start_row, start_col)
+            self._ordered_selection = (end_row, end_col, start_row, start_col)
         else:
-            return (start_row, start_col, end_row, end_col)
+            self._ordered_selection = (start_row, start_col, end_row, end_col)
+        return self._ordered_selection
     
     def delete_selection(self):
-        if not self.has_selection():
+        if not self.selection_active:
             return
             
         start_row, start_col, end_row, end_col = self.get_ordered_selection()
@@ -192,6 +240,7 @@ class TextBuffer:
         if start_row == end_row:
             line = self.lines[start_row]
             self.lines[start_row] = line[:start_col] + line[end_col:]
+            self.mark_dirty(start_row, start_row)
             self.cursor_row = start_row
             self.cursor_col = start_col
         else:
@@ -199,13 +248,9 @@ class TextBuffer:
             start_line = self.lines[start_row]
             end_line = self.lines[end_row]
             
-            # Create new line that joins start and end
+            # Replace the selected lines with one that joins start and end
             new_line = start_line[:start_col] + end_line[end_col:]
-            self.lines[start_row] = new_line
-            
-            # Remove all lines in between
-            for _ in range(end_row - start_row):
-                self.lines.pop(start_row + 1)
+            self._splice_lines(start_row, end_row + 1, [new_line])
             
             # Set cursor position
             self.cursor_row = start_row
@@ -215,7 +260,7 @@ class TextBuffer:
         self.clear_selection()
     
     def get_selected_text(self):
-        if not self.has_selection():
+        if not self.selection_active:
             return ""
             
         start_row, start_col, end_row, end_col = self.get_ordered_selection()
@@ -223,13 +268,11 @@ class TextBuffer:
         if start_row == end_row:
             return self.lines[start_row][start_col:end_col]
         else:
-            result = []
             # First line
-            result.append(self.lines[start_row][start_col:])
+            result = [self.lines[start_row][start_col:]]
             
             # Middle lines
-            for row in range(start_row + 1, end_row):
-                result.append(self.lines[row])
+            result.extend(self.lines[start_row + 1:end_row])
             
             # Last line
             result.append(self.lines[end_row][:end_col])
@@ -237,17 +280,26 @@ class TextBuffer:
             return '\n'.join(result)
     
     def insert_text(self, text):
+        # Split text into lines
+        self.insert_lines(text.split('\n'))
+    
+    def insert_lines(self, text_lines):
+        """Insert text that has already been split on newlines.
+        
+        text_lines is left untouched so callers can insert it repeatedly."""
         # Remove any selected text first
         self.delete_selection()
         
-        # Split text into lines
-        text_lines = text.split('\n')
-        
         if len(text_lines) == 1:
-            # Simple case - just insert the text
+            # Simple case - just insert the text. Typing at the end of a line
+            # is the common case and only needs a single copy.
             current_line = self.lines[self.cursor_row]
-            new_line = current_line[:self.cursor_col] + text_lines[0] + current_line[self.cursor_col:]
+            if self.cursor_col == len(current_line):
+                new_line = current_line + text_lines[0]
+            else:
+                new_line = current_line[:self.cursor_col] + text_lines[0] + current_line[self.cursor_col:]
             self.lines[self.cursor_row] = new_line
+            self.mark_dirty(self.cursor_row, self.cursor_row)
             self.cursor_col += len(text_lines[0])
         else:
             # Complex case - handle multiple lines
@@ -255,20 +307,18 @@ class TextBuffer:
             before_cursor = current_line[:self.cursor_col]
             after_cursor = current_line[self.cursor_col:]
             
-            # First line combines with text before cursor
-            self.lines[self.cursor_row] = before_cursor + text_lines[0]
-            
-            # Middle lines
-            for i in range(1, len(text_lines) - 1):
-                self.lines.insert(self.cursor_row + i, text_lines[i])
-            
-            # Last line combines with text after cursor
+            # First line combines with text before cursor, last line with text
+            # after cursor; the whole block replaces the cursor line in one go
             last_index = len(text_lines) - 1
-            self.lines.insert(self.cursor_row + last_index, text_lines[last_index] + after_cursor)
+            last_line = text_lines[last_index]
+            new_lines = list(text_lines)
+            new_lines[0] = before_cursor + text_lines[0]
+            new_lines[last_index] = last_line + after_cursor
+            self._splice_lines(self.cursor_row, self.cursor_row + 1, new_lines)
             
             # Update cursor position
             self.cursor_row += last_index
-            self.cursor_col = len(text_lines[last_index])
+            self.cursor_col = len(last_line)
     
     def ensure_cursor_visible(self, visible_lines):
         # Scroll up if cursor is above visible area
@@ -1,23 +1,70 @@
 
+import time
+from concurrent.futures import ThreadPoolExecutor
 from TextBuffer import TextBuffer
 from Renderer import Renderer
 from TextEditorClient import TextEditorClient
 
+SHIFT_KEYS = frozenset(("LeftShift", "RightShift"))
+CONTROL_KEYS = frozenset(("LeftControl", "RightControl"))
+
 ### TextEditor ###
 # This class handles user input, text manipulation, and rendering of the text
 # It communicates with a client to draw on a canvas and uses a text buffer
 # to manage the text content and cursor position.
 
 class TextEditor:
+    # Repaints requested by event handlers are coalesced into at most one
+    # frame per interval
+    FRAME_INTERVAL = 1 / 60
+    
     def __init__(self, host='localhost', port=5005):
         self.client = TextEditorClient(host, port)
         self.buffer = TextBuffer()
         self.renderer = Renderer(self.client, self.buffer)
         self.clipboard = ""
+        self._clipboard_lines = [""]  # clipboard split on newlines, reused by every paste
         self.shift_pressed = False
         self.ctrl_pressed = False
         self.modified = False
         self.filename = "untitled.txt"
+        self._render_pending = False
+        self._last_render_time = 0.0
+        self._pending_move = None  # Latest (x, y) drag position not yet applied
+        self._type_buffer = []  # Characters typed since the last frame, not yet inserted
+        self._io_pool = ThreadPoolExecutor(max_workers=1)  # File writes stay off the event loop
+        self._pending_save = None  # Future of the most recently submitted save
+        self.profiler = None  # Set by main.py when running with --profile
+        
+        # Key name -> handler, one table for Ctrl shortcuts and one for
+        # plain keys, so a keypress costs a single lookup
+        self._ctrl_handlers = {
+            "c": self._copy,
+            "x": self._cut,
+            "v": self._paste,
+            "a": self.buffer.select_all,
+            "z": self._undo,
+            "y": self._redo,
+            "s": self._save,
+            "n": self._new_file,
+            "l": self.renderer.toggle_line_numbers,
+            "h": self.renderer.toggle_legend,
+            "F1": self._print_profile,
+        }
+        # Plain keys map to (handler, whether it always edits the text)
+        self._key_handlers = {
+            "BackSpace": (self.buffer.delete_char, True),
+            "Delete": (self._delete_forward, True),
+            "Left": (lambda: self.buffer.move_cursor_left(self.shift_pressed), False),
+            "Right": (lambda: self.buffer.move_cursor_right(self.shift_pressed), False),
+            "Up": (lambda: self.buffer.move_cursor_up(self.shift_pressed), False),
+            "Down": (lambda: self.buffer.move_cursor_down(self.shift_pressed), False),
+            "Home": (self._home, False),
+            "End": (self._end, False),
+            "Return": (lambda: self.buffer.insert_char('\n'), True),
+            "Tab": (self._insert_tab, True),
+            "Escape": (self.buffer.clear_selection, False),
+        }
         
     def start(self):
         if not self.client.connect():
@@ -38,186 +85,255 @@ class TextEditor:
         
         print("Text editor started!")
         return True
+    
+    def _schedule_render(self):
+        """Request a repaint; every event handled before it runs shares it"""
+        if not self._render_pending:
+            self._render_pending = True
+            self.client.schedule_on_main(self._flush_render)
+    
+    def _flush_render(self):
+        # Keep to one frame per interval. If the last frame was too recent,
+        # come back when the interval is up; the loop keeps reading events
+        # meanwhile and they all land in that frame.
+        delay = self._last_render_time + self.FRAME_INTERVAL - time.monotonic()
+        if delay > 0:
+            self.client.call_later(delay, self._flush_render)
+            return
+        self._render_pending = False
+        self._flush_pending_input()
+        self.renderer.render()
+        self._last_render_time = time.monotonic()
         
-    def handle_resize(self, event_parts):
-        if len(event_parts) >= 3:
-            width = int(event_parts[1])
-            height = int(event_parts[2])
-            self.renderer.canvas_width = width
-            self.renderer.canvas_height = height
-            self.renderer.render()
-    
-    def handle_keydown(self, event_parts):
-        if len(event_parts) >= 2:
-            key = event_parts[1]
+    def handle_resize(self, width, height):
+        # Window managers resend the current size on focus and expose
+        if width == self.renderer.canvas_width and height == self.renderer.canvas_height:
+            return
+        self.renderer.canvas_width = width
+        self.renderer.canvas_height = height
+        self._schedule_render()
+    
+    def _flush_pending_input(self):
+        """Apply the typing and dragging that is being held for the next frame"""
+        if self._type_buffer:
+            # A run of typed characters goes in as one insert
+            text = ''.join(self._type_buffer)
+            self._type_buffer.clear()
+            self.buffer.insert_text(text)
+        self._apply_pending_move()
+    
+    def handle_keydown(self, key):
+        # A drag that came in before this key has to land first
+        if self._pending_move is not None:
+            self._flush_pending_input()
+        
+        # Track modifier keys
+        if key in SHIFT_KEYS:
+            self.shift_pressed = True
+            return
+        elif key in CONTROL_KEYS:
+            self.ctrl_pressed = True
+            return
             
-            # Track modifier keys
-            if key == "LeftShift" or key == "RightShift":
-                self.shift_pressed = True
-                return
-            elif key == "LeftControl" or key == "RightControl":
-                self.ctrl_pressed = True
-                return
-                
+        if self.ctrl_pressed:
             # Handle keyboard shortcuts with Ctrl key
-            if self.ctrl_pressed:
-                if key == "c":  # Copy
-                    if self.buffer.has_selection():
-                        self.clipboard = self.buffer.get_selected_text()
-                elif key == "x":  # Cut
-                    if self.buffer.has_selection():
-                        self.clipboard = self.buffer.get_selected_text()
-                        self.buffer.delete_selection()
-                        self.modified = True
-                elif key == "v":  # Paste
-                    if self.clipboard:
-                        self.buffer.insert_text(self.clipboard)
-                        self.modified = True
-                elif key == "a":  # Select all
-                    self.buffer.selection_start = (0, 0)
-                    last_row = len(self.buffer.lines) - 1
-                    last_col = len(self.buffer.lines[last_row])
-                    self.buffer.selection_end = (last_row, last_col)
-                    self.buffer.cursor_row = last_row
-                    self.buffer.cursor_col = last_col
-                elif key == "z":  # Undo (placeholder for future implementation)
-                    pass
-                elif key == "y":  # Redo (placeholder for future implementation)
-                    pass
-                elif key == "s":  # Save (placeholder for future implementation)
-                    print(f"Would save file as {self.filename}")
-                    self.modified = False
-                elif key == "n":  # New file
-                    self.buffer.lines = [""]
-                    self.buffer.cursor_row = 0
-                    self.buffer.cursor_col = 0
-                    self.buffer.clear_selection()
-                    self.buffer.scroll_y = 0
-                    self.modified = False
-                    self.filename = "untitled.txt"
-                elif key == "l":  # Toggle line numbers
-                    self.renderer.toggle_line_numbers()
-                elif key == "h":  # Toggle help/legend
-                    self.renderer.toggle_legend()
+            handler = self._ctrl_handlers.get(key)
+            if not handler:
+                return
+            self._flush_pending_input()
+            handler()
+        else:
+            entry = self._key_handlers.get(key)
+            if entry:
+                handler, modifies = entry
+                self._flush_pending_input()
+                handler()
+            elif len(key) == 1:  # Regular character
+                # Held until the next frame or the next non-character key so
+                # that a run of typing becomes a single insert
+                self._type_buffer.append(key)
+                modifies = True
             else:
-                # Handle navigation keys
-                if key == "BackSpace":
-                    self.buffer.delete_char()
-                    self.modified = True
-                elif key == "Delete":
-                    # If there's a selection, delete it
-                    if self.buffer.has_selection():
-                        self.buffer.delete_selection()
-                    # Otherwise delete character after cursor
-                    elif self.buffer.cursor_col < len(self.buffer.lines[self.buffer.cursor_row]):
-                        # Move cursor right and then delete backwards
-                        self.buffer.move_cursor_right()
-                        self.buffer.delete_char()
-                    # If at end of line but not last line, join with next line
-                    elif self.buffer.cursor_row < len(self.buffer.lines) - 1:
-                        next_line = self.buffer.lines[self.buffer.cursor_row + 1]
-                        self.buffer.lines[self.buffer.cursor_row] += next_line
-                        self.buffer.lines.pop(self.buffer.cursor_row + 1)
-                    self.modified = True
-                elif key == "Left":
-                    self.buffer.move_cursor_left(self.shift_pressed)
-                elif key == "Right":
-                    self.buffer.move_cursor_right(self.shift_pressed)
-                elif key == "Up":
-                    self.buffer.move_cursor_up(self.shift_pressed)
-                elif key == "Down":
-                    self.buffer.move_cursor_down(self.shift_pressed)
-                elif key == "Home":
-                    # Move to beginning of line
-                    self.buffer.cursor_col = 0
-                    if self.shift_pressed:
-                        if not self.buffer.has_selection():
-                            self.buffer.selection_start = (self.buffer.cursor_row, self.buffer.cursor_col)
-                        self.buffer.selection_end = (self.buffer.cursor_row, 0)
-                elif key == "End":
-                    # Move to end of line
-                    self.buffer.cursor_col = len(self.buffer.lines[self.buffer.cursor_row])
-                    if self.shift_pressed:
-                        if not self.buffer.has_selection():
-                            self.buffer.selection_start = (self.buffer.cursor_row, self.buffer.cursor_col)
-                        self.buffer.selection_end = (self.buffer.cursor_row, self.buffer.cursor_col)
-                elif key == "Return":
-                    self.buffer.insert_char('\n')
-                    self.modified = True
-                elif key == "Tab":
-                    # Insert 4 spaces for tab
-                    for _ in range(4):
-                        self.buffer.insert_char(' ')
-                    self.modified = True
-                elif key == "Escape":
-                    # Clear selection
-                    self.buffer.clear_selection()
-                elif len(key) == 1:  # Regular character
-                    self.buffer.insert_char(key)
-                    self.modified = True
+                return  # Unbound key, nothing to repaint
             
-            # Re-render after any key action
-            self.renderer.render()
+            # Only the first edit after a save has anything to record
+            if modifies and not self.modified:
+                self.modified = True
+        
+        # Repaint after any key action
+        self._schedule_render()
     
-    def handle_keyup(self, event_parts):
-        if len(event_parts) >= 2:
-            key = event_parts[1]
-            
-            # Track modifier keys
-            if key == "LeftShift" or key == "RightShift":
-                self.shift_pressed = False
-            elif key == "LeftControl" or key == "RightControl":
-                self.ctrl_pressed = False
-    
-    def handle_mousedown(self, event_parts):
-        if len(event_parts) >= 3:
-            x = int(event_parts[1])
-            y = int(event_parts[2])
-            
-            # Check if click is in the text content area
-            content_x = self.renderer.gutter_width if self.renderer.line_numbers else 0
+    # Ctrl shortcuts
+    def _set_clipboard(self, text):
+        self.clipboard = text
+        self._clipboard_lines = text.split('\n')
+    
+    def _copy(self):
+        if self.buffer.selection_active:
+            self._set_clipboard(self.buffer.get_selected_text())
+    
+    def _cut(self):
+        if self.buffer.selection_active:
+            self._set_clipboard(self.buffer.get_selected_text())
+            self.buffer.delete_selection()
+            self.modified = True
+    
+    def _paste(self):
+        if self.clipboard:
+            # Replacing a selection is a delete plus an insert; repaint once
+            with self.buffer.batch():
+                self.buffer.insert_lines(self._clipboard_lines)
+            self.modified = True
+    
+    def _undo(self):
+        pass  # Placeholder for future implementation
+    
+    def _redo(self):
+        pass  # Placeholder for future implementation
+    
+    def _save(self):
+        # Write from a snapshot on the IO worker. A save still waiting
+        # behind another one is out of date, so drop it.
+        if self._pending_save is not None:
+            self._pending_save.cancel()
+        version = self.buffer.version
+        self._pending_save = self._io_pool.submit(self._do_save, self.filename, self.buffer.snapshot())
+        self._pending_save.add_done_callback(lambda future: self._save_done(future, version))
+    
+    def _do_save(self, filename, lines):
+        try:
+            with open(filename, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines))
+            print(f"Saved {filename}")
+            return True
+        except OSError as e:
+            print(f"Save error: {e}")
+            return False
+    
+    def _save_done(self, future, version):
+        # Runs on the IO worker; the flag belongs to the event loop
+        if not future.cancelled() and future.result():
+            self.client.schedule_on_main(lambda: self._mark_saved(version))
+    
+    def _mark_saved(self, version):
+        # Edits made while the save was running are not on disk
+        if self.buffer.version == version:
+            self.modified = False
+    
+    def _new_file(self):
+        self.buffer.reset()
+        self.modified = False
+        self.filename = "untitled.txt"
+    
+    def _print_profile(self):
+        if self.profiler:
+            self.profiler.report()
+    
+    # Plain keys
+    def _delete_forward(self):
+        buf = self.buffer
+        row = buf.cursor_row
+        # If there's a selection, delete it
+        if buf.selection_active:
+            buf.delete_selection()
+        # Otherwise delete character after cursor
+        elif buf.cursor_col < buf.line_length(row):
+            # Move cursor right and then delete backwards
+            buf.move_cursor_right()
+            buf.delete_char()
+        # If at end of line but not last line, join with next line
+        elif row < buf.line_count() - 1:
+            buf.join_with_next(row)
+    
+    def _home(self):
+        # Move to beginning of line
+        buf = self.buffer
+        row = buf.cursor_row
+        buf.cursor_col = 0
+        if self.shift_pressed:
+            if not buf.selection_active:
+                buf.selection_start = (row, 0)
+            buf.selection_end = (row, 0)
+    
+    def _end(self):
+        # Move to end of line
+        buf = self.buffer
+        row = buf.cursor_row
+        line_len = buf.line_length(row)
+        buf.cursor_col = line_len
+        if self.shift_pressed:
+            if not buf.selection_active:
+                buf.selection_start = (row, line_len)
+            buf.selection_end = (row, line_len)
+    
+    def _insert_tab(self):
+        # Insert 4 spaces for tab as a single edit
+        self.buffer.insert_text(' ' * 4)
+    
+    def handle_keyup(self, key):
+        # Track modifier keys
+        if key in SHIFT_KEYS:
+            self.shift_pressed = False
+        elif key in CONTROL_KEYS:
+            self.ctrl_pressed = False
+    
+    def handle_mousedown(self, x, y):
+        self._flush_pending_input()
+        
+        # Check if click is in the text content area
+        buf = self.buffer
+        content_x = self.renderer.content_x
+        row = buf.scroll_y + (y // buf.char_height)
+        if 0 <= row < buf.line_count():
             if x < content_x:
-                # Click in gutter - select whole line
-                content_height = self.renderer.canvas_height - self.renderer.status_bar_height
-                row = self.buffer.scroll_y + (y // self.buffer.char_height)
-                
-                if 0 <= row < len(self.buffer.lines):
-                    # Select the entire line
-                    self.buffer.selection_start = (row, 0)
-                    self.buffer.selection_end = (row, len(self.buffer.lines[row]))
-                    self.buffer.cursor_row = row
-                    self.buffer.cursor_col = len(self.buffer.lines[row])
+                # Click in gutter - select the entire line
+                line_len = buf.line_length(row)
+                buf.selection_start = (row, 0)
+                buf.selection_end = (row, line_len)
+                buf.cursor_row = row
+                buf.cursor_col = line_len
             else:
                 # Click in text area - move cursor
-                content_height = self.renderer.canvas_height - self.renderer.status_bar_height
-                row = self.buffer.scroll_y + (y // self.buffer.char_height)
-                col = (x - content_x) // self.buffer.char_width
-                
-                if 0 <= row < len(self.buffer.lines):
-                    self.buffer.move_cursor_to_position(row, col, self.shift_pressed)
-            
-            self.renderer.render()
+                col = (x - content_x) // buf.char_width
+                buf.move_cursor_to_position(row, col, self.shift_pressed)
+        
+        self._schedule_render()
     
-    def handle_mousemove(self, event_parts):
-        if len(event_parts) >= 3 and self.buffer.has_selection():
-            x = int(event_parts[1])
-            y = int(event_parts[2])
-            
-            # Calculate row and column from coordinates
-            content_x = self.renderer.gutter_width if self.renderer.line_numbers else 0
-            content_height = self.renderer.canvas_height - self.renderer.status_bar_height
-            row = self.buffer.scroll_y + (y // self.buffer.char_height)
-            col = max(0, (x - content_x) // self.buffer.char_width)
-            
-            # Ensure valid row and column
-            if 0 <= row < len(self.buffer.lines):
-                # Update cursor and selection end
-                col = min(col, len(self.buffer.lines[row]))
-                self.buffer.cursor_row = row
-                self.buffer.cursor_col = col
-                self.buffer.selection_end = (row, col)
-                self.renderer.render()
-    
-    def handle_mouseup(self, event_parts):
+    def handle_mousemove(self, x, y):
+        if self.buffer.selection_active:
+            # Moves within one frame overwrite each other and only the latest
+            # is applied, right before the frame is drawn
+            self._pending_move = (x, y)
+            self._schedule_render()
+    
+    def _apply_pending_move(self):
+        # Other events call this first so the drag stays in order with them
+        if self._pending_move is None:
+            return
+        x, y = self._pending_move
+        self._pending_move = None
+        buf = self.buffer
+        if not buf.selection_active:
+            return
+        
+        # Calculate row and column from coordinates
+        content_x = self.renderer.content_x
+        row = buf.scroll_y + (y // buf.char_height)
+        col = max(0, (x - content_x) // buf.char_width)
+        
+        # Earlier moves of the drag have been dropped, so a position past
+        # either end of the document is clamped to it rather than ignored
+        row = max(0, min(row, buf.line_count() - 1))
+        col = min(col, buf.line_length(row))
+        
+        # Update cursor and selection end, unless the pointer is still over
+        # the same character
+        if row == buf.cursor_row and col == buf.cursor_col:
+            return
+        buf.cursor_row = row
+        buf.cursor_col = col
+        buf.selection_end = (row, col)
+    
+    def handle_mouseup(self, x, y):
         # Nothing special to do on mouse up for now
         pass
\ No newline at end of file
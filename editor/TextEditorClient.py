@@ -1,6 +1,11 @@
 #!/usr/bin/env python3
+import heapq
+import selectors
 import socket
 import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 
 ### TextEditorClient.py ###
 # This module defines a TextEditorClient class that connects to a socket server
@@ -9,6 +14,14 @@ import threading
 # events, and manage a text buffer. 
 
 class TextEditorClient:
+    # Events whose handlers are called with (x, y) integer coordinates; the
+    # other events pass the key name as a single string
+    COORDINATE_EVENTS = frozenset(('resize', 'mousedown', 'mouseup', 'mousemove'))
+    # Large enough that a whole burst of queued events comes back from one recv
+    RECV_SIZE = 65536
+    # Encoded text commands kept for reuse; the cache starts over when full
+    TEXT_CACHE_SIZE = 4096
+    
     def __init__(self, host='localhost', port=5005):
         self.host = host
         self.port = port
@@ -22,17 +35,43 @@ class TextEditorClient:
             'keydown': [],
             'keyup': []
         }
+        # Event name -> (callable, takes coordinates), rebuilt by on(). With
+        # one handler registered the callable is that handler itself.
+        self._dispatch = {}
+        # Everything runs on the thread that calls poll(). Other threads hand
+        # it work through schedule_on_main and wake it with a byte on _wake_w.
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        self._callbacks = deque()  # Callbacks waiting for the loop thread
+        self._timers = []  # Heap of (due time, sequence, callback) from call_later
+        self._timer_seq = 0
+        self._loop_thread = threading.get_ident()
+        # Reads land directly in one reusable buffer; the first _rx_used
+        # bytes are received data not yet split into events
+        self._rx = bytearray(self.RECV_SIZE)
+        self._rx_view = memoryview(self._rx)
+        self._rx_used = 0
+        self._batch = None  # Commands collected between begin_batch and end_batch
+        self._batch_depth = 0
+        self._outbuf = bytearray()  # Output the socket would not take yet, sent when writable
+        self._color_bytes = {}  # Color string -> encoded bytes; the renderer uses a small palette
+        self._text_templates = {}  # (color, text) -> text command with %d slots for x and y
 
     def connect(self):
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.connect((self.host, self.port))
+            # Frames go out as one write each, so don't let Nagle hold them back
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            # Writes that don't fit in the socket buffer are queued rather
+            # than blocking the loop; see _send_bytes
+            self.socket.setblocking(False)
             self.connected = True
             
-            # Start listening for events
-            self.listen_thread = threading.Thread(target=self.listen_for_events)
-            self.listen_thread.daemon = True
-            self.listen_thread.start()
+            # Events are read by poll() once the socket is readable
+            self._selector.register(self.socket, selectors.EVENT_READ)
             
             return True
         except (socket.error, socket.gaierror) as e:
@@ -42,7 +81,9 @@ class TextEditorClient:
     def disconnect(self):
         if self.connected:
             self.connected = False
+            self._selector.unregister(self.socket)
             self.socket.close()
+            self._outbuf.clear()
 
     def send_command(self, command):
         if not self.connected:
@@ -51,55 +92,257 @@ class TextEditorClient:
         if not command.endswith('\n'):
             command += '\n'
         
-        try:
-            self.socket.sendall(command.encode('utf-8'))
+        return self.send_bytes(command.encode('utf-8'))
+
+    def send_bytes(self, data):
+        """Send already encoded, newline-terminated commands (batched if a batch is open)"""
+        if not self.connected:
+            return False
+        if self._batch is not None:
+            self._batch += data
+            return True
+        return self._send_bytes(data)
+
+    def _color(self, color):
+        encoded = self._color_bytes.get(color)
+        if encoded is None:
+            encoded = self._color_bytes[color] = color.encode('ascii')
+        return encoded
+
+    def _text_template(self, color, text):
+        # The same lines and labels are drawn frame after frame, so encode
+        # each one once and only fill in the position per call
+        key = (color, text)
+        template = self._text_templates.get(key)
+        if template is None:
+            if len(self._text_templates) >= self.TEXT_CACHE_SIZE:
+                self._text_templates.clear()
+            # A newline would end the command early; % is doubled because
+            # the result is itself a format string
+            payload = text.replace('\n', ' ').encode('utf-8').replace(b'%', b'%%')
+            template = self._text_templates[key] = b"text,%%d,%%d,%s,%s\n" % (self._color(color), payload)
+        return template
+
+    def _send_bytes(self, data):
+        if self._outbuf:
+            # Earlier output is still waiting; this has to go out after it
+            self._outbuf += data
             return True
+        try:
+            sent = self.socket.send(data)
+        except BlockingIOError:
+            sent = 0
         except (socket.error, socket.timeout) as e:
             print(f"Send error: {e}")
-            self.connected = False
+            self.disconnect()
             return False
+        if sent < len(data):
+            # The socket buffer is full. Keep the rest and let poll() send
+            # it once the canvas has read enough to make room.
+            self._outbuf += memoryview(data)[sent:]
+            self._selector.modify(self.socket, selectors.EVENT_READ | selectors.EVENT_WRITE)
+        return True
 
-    def listen_for_events(self):
-        buffer = ""
+    def _flush_output(self):
+        try:
+            sent = self.socket.send(self._outbuf)
+        except BlockingIOError:
+            return
+        except (socket.error, socket.timeout) as e:
+            print(f"Send error: {e}")
+            self.disconnect()
+            return
+        del self._outbuf[:sent]
+        if not self._outbuf:
+            self._selector.modify(self.socket, selectors.EVENT_READ)
+
+    def begin_batch(self):
+        """Collect commands in memory until the matching end_batch"""
+        self._batch_depth += 1
+        if self._batch is None:
+            self._batch = bytearray()
+
+    def end_batch(self):
+        """Send everything collected since the outermost begin_batch in one write"""
+        self._batch_depth -= 1
+        if self._batch_depth:
+            return True
+        data = self._batch
+        self._batch = None
+        if not data or not self.connected:
+            return self.connected
+        return self._send_bytes(data)
+
+    @contextmanager
+    def batch(self):
+        self.begin_batch()
+        try:
+            yield self
+        finally:
+            self.end_batch()
+
+    @contextmanager
+    def capture(self):
+        """Collect the commands issued inside the block into a bytearray instead
+        of sending them, e.g. to replay them later with send_bytes"""
+        saved = self._batch, self._batch_depth
+        self._batch = captured = bytearray()
+        self._batch_depth = 1
+        try:
+            yield captured
+        finally:
+            self._batch, self._batch_depth = saved
+
+    def _read_events(self):
+        buffer = self._rx
+        used = self._rx_used
+        if used == len(buffer):
+            # An unfinished event fills the whole buffer, so make it bigger
+            self._rx_view.release()
+            buffer.extend(bytes(len(buffer)))
+            self._rx_view = memoryview(buffer)
         
-        while self.connected:
-            try:
-                data = self.socket.recv(1024).decode('utf-8')
-                if not data:
-                    self.connected = False
-                    break
-                
-                buffer += data
-                
-                # Process complete events (ones that end with newline)
-                while '\n' in buffer:
-                    line, buffer = buffer.split('\n', 1)
-                    self.process_event(line)
-                    
-            except (socket.error, socket.timeout) as e:
-                print(f"Receive error: {e}")
-                self.connected = False
-                break
-
-    def process_event(self, event_str):
-        parts = event_str.split(',')
-        if len(parts) >= 1:
-            event_type = parts[0]
-            
-            if event_type in self.event_handlers:
-                for handler in self.event_handlers[event_type]:
-                    handler(parts)
+        try:
+            received = self.socket.recv_into(self._rx_view[used:])
+        except BlockingIOError:
+            return
+        except (socket.error, socket.timeout) as e:
+            print(f"Receive error: {e}")
+            received = 0
+        if not received:
+            self.disconnect()
+            return
+        used += received
+        
+        # Split off complete events (ones that end with newline). Events stay
+        # as bytes; only key names are ever decoded, and only once a whole
+        # line has arrived, so a character split across two reads is never
+        # cut apart.
+        end = buffer.rfind(b'\n', 0, used)
+        if end == -1:
+            self._rx_used = used
+            return
+        events = bytes(self._rx_view[:end]).split(b'\n')
+        
+        # Move the partial event after the last newline to the front. The
+        # source and destination can overlap, so copy it out first; it is a
+        # single partial event, so the copy is small.
+        tail = used - end - 1
+        buffer[:tail] = bytes(self._rx_view[end + 1:used])
+        self._rx_used = tail
+        
+        # A mousemove followed directly by another one is superseded by it,
+        # so only the last of each run gets parsed and dispatched
+        last = len(events) - 1
+        for i, event in enumerate(events):
+            if (i < last and event.startswith(b'mousemove,')
+                    and events[i + 1].startswith(b'mousemove,')):
+                continue
+            self.process_event(event)
+
+    def process_event(self, event):
+        """Dispatch one event line, given as bytes without the newline"""
+        parts = event.split(b',', 2)
+        entry = self._dispatch.get(parts[0])
+        if entry is None:
+            return
+        
+        # Parse the fields once here rather than in every handler
+        call, coordinates = entry
+        if coordinates:
+            if len(parts) < 3:
+                return
+            call(int(parts[1]), int(parts[2]))
+        elif len(parts) >= 2:
+            call(parts[1].decode('utf-8'))
 
     def on(self, event_type, handler):
         if event_type in self.event_handlers:
-            self.event_handlers[event_type].append(handler)
+            handlers = self.event_handlers[event_type]
+            handlers.append(handler)
+            if len(handlers) == 1:
+                call = handler
+            else:
+                def call(*args, handlers=tuple(handlers)):
+                    for handler in handlers:
+                        handler(*args)
+            self._dispatch[event_type.encode('ascii')] = (call, event_type in self.COORDINATE_EVENTS)
+
+    def schedule_on_main(self, callback):
+        """Queue a callback to run on the thread that drives poll()"""
+        self._callbacks.append(callback)
+        if threading.get_ident() != self._loop_thread:
+            self._wake_w.send(b'\0')
 
-    # Canvas API commands
+    def call_later(self, delay, callback):
+        """Run callback on the loop thread after delay seconds.
+        
+        Only call this from the loop thread itself."""
+        self._timer_seq += 1
+        heapq.heappush(self._timers, (time.monotonic() + delay, self._timer_seq, callback))
+
+    def poll(self, timeout=None):
+        """Run one pass of the event loop on the calling thread.
+        
+        Waits up to timeout seconds for input from the canvas, a queued
+        callback or the next timer, handles every event that has arrived,
+        then runs the timers that are due and the callbacks that were
+        queued before this pass."""
+        self._loop_thread = threading.get_ident()
+        timers = self._timers
+        if self._callbacks:
+            timeout = 0
+        elif timers:
+            until_timer = max(0, timers[0][0] - time.monotonic())
+            if timeout is None or until_timer < timeout:
+                timeout = until_timer
+        for key, mask in self._selector.select(timeout):
+            if key.fileobj is self._wake_r:
+                try:
+                    while self._wake_r.recv(4096):
+                        pass
+                except BlockingIOError:
+                    pass
+                continue
+            if mask & selectors.EVENT_WRITE and self.connected:
+                self._flush_output()
+            if mask & selectors.EVENT_READ and self.connected:
+                self._read_events()
+        
+        now = time.monotonic()
+        while timers and timers[0][0] <= now:
+            heapq.heappop(timers)[2]()
+        
+        callbacks = self._callbacks
+        for _ in range(len(callbacks)):
+            callbacks.popleft()()
+
+    # Canvas API commands. These format straight to bytes (the canvas only
+    # takes integer coordinates) instead of building a str and encoding it.
     def draw_rect(self, x, y, width, height, color):
-        return self.send_command(f"rect,{x},{y},{width},{height},{color}")
+        return self.send_bytes(b"rect,%d,%d,%d,%d,%s\n" % (x, y, width, height, self._color(color)))
+
+    def draw_border(self, x, y, width, height, color):
+        """Draw a 1px rectangle outline as four edge rects in a single socket write"""
+        color = self._color(color)
+        return self.send_bytes(
+            b"rect,%d,%d,%d,1,%s\n" % (x, y, width, color) +
+            b"rect,%d,%d,1,%d,%s\n" % (x, y, height, color) +
+            b"rect,%d,%d,1,%d,%s\n" % (x + width - 1, y, height, color) +
+            b"rect,%d,%d,%d,1,%s\n" % (x, y + height - 1, width, color)
+        )
 
     def draw_text(self, x, y, color, text):
-        return self.send_command(f"text,{x},{y},{color},{text}")
+        return self.send_bytes(self._text_template(color, text) % (x, y))
+
+    def draw_text_batch(self, items):
+        """Draw a list of (x, y, color, text) tuples with a single socket write"""
+        if not items:
+            return True
+        template = self._text_template
+        return self.send_bytes(b"".join(
+            template(color, text) % (x, y) for x, y, color, text in items
+        ))
 
     def clear_screen(self):
         return self.send_command("clear")
@@ -1,11 +1,15 @@
-import time
 import argparse
 from TextEditor import TextEditor
+from TextEditorClient import TextEditorClient
+from TextBuffer import TextBuffer
+from Renderer import Renderer
+from Profiler import Profiler
 
 def main():    
     parser = argparse.ArgumentParser(description='Text Editor using Canvas Socket API')
     parser.add_argument('--host', default='localhost', help='Canvas API host')
     parser.add_argument('--port', type=int, default=5005, help='Canvas API port')
+    parser.add_argument('--profile', action='store_true', help='Time the hot paths; Ctrl+F1 prints the results')
     
     args = parser.parse_args()
     
@@ -19,11 +23,27 @@ def main():
     print("  Ctrl+L - Toggle Line Numbers")
     print("  Ctrl+H - Toggle Command Legend")
     
+    # Wrap the classes before the editor is built so that the handler
+    # tables it creates pick up the timed methods
+    profiler = None
+    if args.profile:
+        print("  Ctrl+F1 - Print Profile")
+        profiler = Profiler()
+        profiler.wrap(TextEditorClient, '_send_bytes', count_bytes=True)
+        profiler.wrap(TextEditorClient, '_read_events')
+        profiler.wrap(TextEditor, 'handle_keydown')
+        profiler.wrap(TextBuffer, 'insert_text')
+        profiler.wrap(TextBuffer, 'delete_char')
+        profiler.wrap(Renderer, 'render')
+    
     editor = TextEditor(args.host, args.port)  # Ensure TextEditor is a class
+    editor.profiler = profiler
     if editor.start():
         try:
-            while True:
-                time.sleep(0.1)
+            # Canvas events and all drawing are handled on this thread. poll()
+            # sleeps until input, a timer or a queued callback needs it.
+            while editor.client.connected:
+                editor.client.poll()
         except KeyboardInterrupt:
             print("\nExiting...")
             editor.client.disconnect()